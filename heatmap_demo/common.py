@@ -5,6 +5,10 @@
 import math
 from typing import Any
 
+# Third-party modules
+import numpy as np
+import pandas as pd
+
 
 ###############################################################################
 def split_thousands(value: Any, decimals: int = 2) -> str:
@@ -58,3 +62,22 @@ def split_thousands(value: Any, decimals: int = 2) -> str:
         return str(value)
 
 
+###############################################################################
+def split_thousands_array(values: Any, decimals: int = 2) -> np.ndarray:
+    """
+    Vectorized version of `split_thousands` for a whole column of numbers.
+    The values are formatted in one go with pandas string methods instead of
+    dispatching on the type of every single value.
+
+    >>> split_thousands_array([1000012, 0.5, None])
+    array(["1'000'012", '0.5', '0'], dtype=object)
+    """
+    # Adding zero turns -0.0 into 0.0 so that it isn't displayed as "-0"
+    numbers = pd.Series(np.asarray(values, dtype=np.float64) + 0.0)
+    # Object dtype so that the string methods also work on an empty column
+    out = numbers.map(f"{{:,.{decimals}f}}".format).astype(object)
+    if decimals > 0:
+        out = out.str.rstrip("0").str.rstrip(".")
+    out = out.str.replace(",", "'", regex=False)
+    out[numbers.isna()] = "0"
+    return out.to_numpy(dtype=object)
@@ -6,9 +6,17 @@ This script starts up a simple FastAPI server that can be used to serve
 the dataframe to a browser in JSON format.
 """
 
+# Built-in modules
+import io
+from functools import lru_cache
+from typing import Literal
+
 # Third-party modules
+import pandas
+import pyarrow
+import pyarrow.ipc
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 # Internal modules
 from heatmap_demo.data.baci_dataset import baci
@@ -20,13 +28,78 @@ app = FastAPI()
 # Load the data once at startup
 df = baci.ranked_oak_df
 
-@app.get("/data")
-def data():
-    """Send the all the raw rows you need (or pre-aggregate if huge)"""
-    return JSONResponse(df.to_dict(orient="records"))
+Format = Literal["json", "parquet", "arrow"]
+Layout = Literal["records", "columnar"]
+
+media_types = {
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def encode(frame, format: Format = "json") -> bytes:
+    """Serialise the dataframe in the requested format.
+    Pandas writes the JSON records in C, which skips building a python
+    dict per row and running them through FastAPI's encoder. The columnar
+    formats are much smaller and faster to decode for clients that can
+    read them with `pandas.read_parquet` or `pyarrow.ipc.open_stream`."""
+    if format == "parquet":
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, engine="pyarrow", compression="zstd")
+        return buffer.getvalue()
+    if format == "arrow":
+        table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return frame.to_json(orient="records").encode("utf-8")
+
+def columnar_json(frame, countries) -> bytes:
+    """Each country name is sent once in a legend, the rows then only
+    carry its position in that legend (its rank minus one) as a small
+    integer, one array per column. Every row of `frame` must be ranked."""
+    columns = {
+        "countries": pandas.Series(countries),
+        "exporter_idx": (frame["exporter_rank"] - 1).astype("int16"),
+        "importer_idx": (frame["importer_rank"] - 1).astype("int16"),
+        "quantity": frame["quantity"],
+    }
+    body = ",".join(
+        f'"{name}":{values.to_json(orient="values")}'
+        for name, values in columns.items()
+    )
+    return ("{" + body + "}").encode("utf-8")
 
-@app.get("/heatmap")
-def heatmap(top_n: int | None = None):
+# The data never changes while the server runs, so every distinct answer is
+# serialised only once and then sent straight from memory.
+@lru_cache(maxsize=None)
+def data_payload(format: Format) -> bytes:
+    return encode(df, format)
+
+@lru_cache(maxsize=1024)
+def heatmap_payload(top_n: int | None, format: Format, layout: Layout) -> bytes:
+    if format == "json" and layout == "columnar":
+        # Unranked rows have no place in the legend, so even the full view
+        # is the top-N view of every ranked country. heatmap() clamps top_n
+        n = len(baci.country_ranks) if top_n is None else top_n
+        return columnar_json(baci.topn_view(n), baci.country_ranks.index[:n])
+    filtered_df = df if top_n is None else baci.topn_view(top_n)
+    columns = ["exporter_name", "importer_name", "quantity"]
+    return encode(filtered_df[columns], format)
+
+@app.get("/data", response_class=Response, response_model=None)
+def data(format: Format = "json"):
+    """Send the all the raw rows you need (or pre-aggregate if huge).
+    Use `?format=parquet` or `?format=arrow` for a columnar response."""
+    return Response(data_payload(format), media_type=media_types[format])
+
+@app.get("/heatmap", response_class=Response, response_model=None)
+def heatmap(
+    top_n: int | None = None,
+    format: Format = "json",
+    layout: Layout = "records",
+):
     """Send only the filtered values you need (or pre-aggregate if huge).
     
     Parameters
@@ -35,16 +108,19 @@ def heatmap(top_n: int | None = None):
         If specified, filter to only include entries where both exporter_rank
         and importer_rank are <= top_n. This gives the top N countries and
         all trade relationships between them.
+    format : "json", "parquet" or "arrow", optional
+        The serialisation of the response, JSON records by default.
+    layout : "records" or "columnar", optional
+        With "columnar" the JSON is one object holding a `countries` legend
+        and the `exporter_idx`, `importer_idx` and `quantity` arrays, which
+        avoids repeating the country names on every row.
     """
-    filtered_df = df
+    # One cache entry per real view: below zero is the empty view and from
+    # the number of countries upwards it is every ranked country
     if top_n is not None:
-        filtered_df = df[
-            (df["exporter_rank"] <= top_n) & (df["importer_rank"] <= top_n)
-        ]
-    out = filtered_df[["exporter_name", "importer_name", "quantity"]].to_dict(
-        orient="records"
-    )
-    return JSONResponse(out)
+        top_n = min(max(top_n, 0), len(baci.country_ranks))
+    body = heatmap_payload(top_n, format, layout)
+    return Response(body, media_type=media_types[format])
 
 # Run it
 if __name__ == "__main__":
@@ -37,29 +37,27 @@ class BokehServerHeatmap:
     def max_n(self) -> int:
         return int(max(self.df["exporter_rank"].max(), self.df["importer_rank"].max()))
 
+    @cached_property
+    def countries_ordered(self) -> list[str]:
+        # Already sorted by rank (1 = largest)
+        return baci.country_ranks.index.tolist()
+
     def _filtered_df(self, top_n: int) -> pd.DataFrame:
-        return self.df[
-            (self.df["exporter_rank"] <= top_n) & (self.df["importer_rank"] <= top_n)
-        ]
+        return baci.topn_view(top_n)
+
+    @staticmethod
+    def _source_data(df: pd.DataFrame) -> dict:
+        """Only the columns used by the glyph and the hover are sent."""
+        columns = ["exporter_name", "importer_name", "quantity"]
+        return {c: df[c].to_numpy() for c in columns}
 
     def make_document(self, doc) -> None:
         default_n = min(10, self.max_n)
         df0 = self._filtered_df(default_n)
 
-        source = ColumnDataSource(df0)
+        source = ColumnDataSource(self._source_data(df0))
 
-        exporters_ordered = (
-            df0[["exporter_name", "exporter_rank"]]
-            .drop_duplicates()
-            .sort_values("exporter_rank")["exporter_name"]
-            .tolist()
-        )
-        importers_ordered = (
-            df0[["importer_name", "importer_rank"]]
-            .drop_duplicates()
-            .sort_values("importer_rank")["importer_name"]
-            .tolist()
-        )
+        exporters_ordered = importers_ordered = self.countries_ordered[:default_n]
 
         mapper = LinearColorMapper(
             palette="Viridis256",
@@ -113,23 +111,24 @@ class BokehServerHeatmap:
         )
 
         def on_slider_change(attr, old, new):
-            df_new = self._filtered_df(int(new))
-            source.data = ColumnDataSource.from_df(df_new)
-            exporters_ordered = (
-                df_new[["exporter_name", "exporter_rank"]]
-                .drop_duplicates()
-                .sort_values("exporter_rank")["exporter_name"]
-                .tolist()
-            )
-            importers_ordered = (
-                df_new[["importer_name", "importer_rank"]]
-                .drop_duplicates()
-                .sort_values("importer_rank")["importer_name"]
-                .tolist()
-            )
-            p.x_range.factors = exporters_ordered
+            old, new = int(old), int(new)
+            if new == old:
+                return
+            df_new = self._filtered_df(new)
+            if new > old:
+                # Growing N only adds the cells of the newly ranked countries,
+                # so only those rows are streamed over the websocket.
+                added = (df_new["exporter_rank"] > old) | (
+                    df_new["importer_rank"] > old
+                )
+                source.stream(self._source_data(df_new[added]))
+            elif new < old:
+                # Bokeh can't remove rows, shrinking replaces the data
+                source.data = self._source_data(df_new)
+            countries = self.countries_ordered[:new]
+            p.x_range.factors = countries
             # Reverse so top-ranked importers appear at the top visually.
-            p.y_range.factors = list(reversed(importers_ordered))
+            p.y_range.factors = countries[::-1]
             mapper.low = float(df_new["quantity"].min())
             mapper.high = float(df_new["quantity"].max())
 
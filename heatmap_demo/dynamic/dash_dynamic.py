@@ -5,9 +5,10 @@
 from functools import cached_property
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from dash import Dash, Input, Output, dcc, html
+from dash import Dash, Input, Output, Patch, dcc, html
 
 # Internal modules
 from heatmap_demo.data.baci_dataset import baci
@@ -19,8 +20,8 @@ class DashHeatmap:
     Run with `python`, not `ipython`, for a blocking server.
     Dash app:
     - Slider controls Top-N countries
-    - Plotly Heatmap requires a dense 2D grid -> we build the full pivot once
-    - Callback slices rows/cols for N and returns a new figure
+    - Plotly Heatmap requires a dense 2D grid -> we build the full matrix once
+    - Callback patches only the axis ranges to zoom on the top-N block
     """
 
     title = "Exporter → Importer heatmap (Top-N countries by total quantity)"
@@ -39,31 +40,33 @@ class DashHeatmap:
         return len(self.countries_ordered)
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
+    def default_n(self) -> int:
+        return min(10, self.max_n)
+
+    @cached_property
+    def full_matrix_np(self) -> np.ndarray:
         """
-        Full NxN pivot matrix (rows=importers, cols=exporters).
-        Missing pairs filled with 0 so any slice is fully populated.
+        Full NxN matrix (rows=importers, cols=exporters) aligned with
+        `countries_ordered`. Missing pairs are 0 so any slice is fully populated.
+        The top-N block is a view [:n, :n].
         """
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
-
-    def _figure_for_n(self, n: int) -> go.Figure:
-        countries = self.countries_ordered[:n]
-        m = self.full_matrix.loc[countries, countries]
+        return baci.quantity_matrix
 
+    @cached_property
+    def full_figure(self) -> go.Figure:
+        """
+        One figure holding the whole matrix, built once when the app is.
+        Changing N only moves the axis ranges, so the browser never receives
+        matrix data or country names again after the first page load.
+        The colour scale spans the whole matrix, as in the static Plotly page.
+        The axes start on the default top-N block with autorange off, so the
+        first paint is already zoomed and Plotly never autoscales on its own.
+        """
+        countries = self.countries_ordered
         fig = go.Figure(
             data=[
                 go.Heatmap(
-                    z=m.to_numpy(),
+                    z=self.full_matrix_np,
                     x=countries,
                     y=countries,
                     colorbar=dict(title="Quantity (tons)"),
@@ -80,11 +83,24 @@ class DashHeatmap:
             width=900,
             height=900,
             margin=dict(l=120, r=80, t=60, b=120),
-            xaxis=dict(title="Exporter country"),
-            yaxis=dict(title="Importer country"),
+            xaxis=dict(
+                title="Exporter country",
+                range=self._axis_range(self.default_n),
+                autorange=False,
+            ),
+            yaxis=dict(
+                title="Importer country",
+                range=self._axis_range(self.default_n),
+                autorange=False,
+            ),
         )
         return fig
 
+    @staticmethod
+    def _axis_range(n: int) -> list[float]:
+        # Categories sit at 0, 1, 2, ... so this shows exactly the first n
+        return [-0.5, n - 0.5]
+
     def _register_callbacks(self, app: Dash) -> None:
         @app.callback(
             Output("heatmap", "figure"),
@@ -93,14 +109,19 @@ class DashHeatmap:
         )
         def _update(top_n: int):
             n = int(top_n)
-            return self._figure_for_n(n), f"Showing {n} × {n} countries"
+            # Only the zoom changes, the data and layout stay in the browser
+            patched = Patch()
+            # Autoscale or a double-click make Plotly write autorange back into
+            # the figure, which would then win over the new range
+            for axis in ("xaxis", "yaxis"):
+                patched["layout"][axis]["range"] = self._axis_range(n)
+                patched["layout"][axis]["autorange"] = False
+            return patched, f"Showing {n} × {n} countries"
 
     @cached_property
     def app(self) -> Dash:
         app = Dash(__name__)
 
-        default_n = min(10, self.max_n)
-
         app.layout = html.Div(
             [
                 html.H3(self.title),
@@ -109,13 +130,13 @@ class DashHeatmap:
                     min=2,
                     max=self.max_n,
                     step=1,
-                    value=default_n,
+                    value=self.default_n,
                     tooltip={"placement": "bottom", "always_visible": False},
                 ),
                 html.Div(
                     id="status", style={"marginTop": "8px", "marginBottom": "8px"}
                 ),
-                dcc.Graph(id="heatmap", figure=self._figure_for_n(default_n)),
+                dcc.Graph(id="heatmap", figure=self.full_figure),
             ],
             style={"maxWidth": "1100px", "margin": "0 auto"},
         )
@@ -133,6 +154,9 @@ class DashHeatmap:
             port=port,
             debug=False,
             use_reloader=False,
+            # Slider moves from several sessions are served concurrently,
+            # they all read the same matrix and the same figure
+            threaded=True,
             jupyter_mode="external",
         )
 
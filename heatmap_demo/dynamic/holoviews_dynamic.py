@@ -23,16 +23,15 @@ class HoloviewsServerHeatmap:
 
     @cached_property
     def heatmap(self) -> pn.Column:
-        # Calculate max_n from the dataframe ranks
-        df = baci.ranked_oak_df
+        # Calculate max_n from the country ranks
         max_n = len(baci.country_ranks)
         default_top_n = min(10, max_n)
 
         # Create a function that generates the heatmap based on top_n
         def create_heatmap(top_n: int) -> hv.HeatMap:
-            filtered_df = df[
-                (df["exporter_rank"] <= top_n) & (df["importer_rank"] <= top_n)
-            ]
+            # Only the plotted columns, so the sort below doesn't copy the rest
+            cols = ["exporter_name", "importer_name", "quantity"]
+            filtered_df = baci.topn_view(top_n)[cols]
             # Create the heatmap
             heatmap = hv.HeatMap(
                 filtered_df,
@@ -53,6 +52,8 @@ class HoloviewsServerHeatmap:
                 tools=["hover"],
                 xrotation=45,
                 yrotation=0,
+                # Each N has its own countries and its own colour range
+                framewise=True,
             )
             return heatmap
 
@@ -66,8 +67,9 @@ class HoloviewsServerHeatmap:
         )
 
         # Create a dynamic map that updates with the slider
-        # Use pn.bind to connect the widget to the function
-        dmap = pn.bind(create_heatmap, top_n=top_n_slider)
+        # The stream lets Bokeh keep the same plot and only swap its data
+        stream = hv.streams.Params(top_n_slider, ["value"], rename={"value": "top_n"})
+        dmap = hv.DynamicMap(create_heatmap, streams=[stream])
 
         # Combine the slider and heatmap in a Panel layout
         return pn.Column(top_n_slider, dmap)
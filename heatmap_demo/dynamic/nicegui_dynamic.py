@@ -5,6 +5,7 @@
 from functools import cached_property
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from nicegui import ui
@@ -32,26 +33,18 @@ class NiceGUIHeatmap:
         return len(self.countries_ordered)
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
+    def full_matrix(self) -> np.ndarray:
+        # Rows are importers and columns exporters, both in rank order,
+        # so the top-N block is the view [:n, :n]
+        return baci.quantity_matrix
 
     def _figure_for_n(self, n: int) -> go.Figure:
         countries = self.countries_ordered[:n]
-        m = self.full_matrix.loc[countries, countries]
 
         fig = go.Figure(
             data=[
                 go.Heatmap(
-                    z=m.to_numpy(),
+                    z=self.full_matrix[:n, :n],
                     x=countries,
                     y=countries,
                     colorbar=dict(title="Quantity (tons)"),
@@ -80,12 +73,18 @@ class NiceGUIHeatmap:
 
         status = ui.label(f"Showing {default_n} × {default_n} countries")
 
-        plot = ui.plotly(self._figure_for_n(default_n))
+        fig = self._figure_for_n(default_n)
+        plot = ui.plotly(fig)
 
         def on_change(e) -> None:
             n = int(e.value)
             status.text = f"Showing {n} × {n} countries"
-            plot.figure = self._figure_for_n(n)
+            # Only the trace data changes, so mutate it instead of rebuilding
+            countries = self.countries_ordered[:n]
+            with fig.batch_update():
+                fig.data[0].z = self.full_matrix[:n, :n]
+                fig.data[0].x = countries
+                fig.data[0].y = countries
             plot.update()
 
         ui.slider(
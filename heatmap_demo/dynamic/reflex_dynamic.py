@@ -10,6 +10,7 @@ from functools import cached_property
 from pathlib import Path
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import reflex as rx
@@ -47,29 +48,21 @@ class ReflexHeatmap:
         return len(self.countries_ordered)
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
+    def full_matrix(self) -> np.ndarray:
         """
         Plotly heatmap wants a dense 2D grid, so build the NxN matrix once and slice.
+        The matrix is scattered from the rank columns in rank order, so Top-N
+        is the view [:n, :n].
         """
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
+        return baci.quantity_matrix
 
     def figure_for_n(self, n: int) -> go.Figure:
         countries = self.countries_ordered[:n]
-        m = self.full_matrix.loc[countries, countries]
 
         fig = go.Figure(
             data=[
                 go.Heatmap(
-                    z=m.to_numpy(),
+                    z=self.full_matrix[:n, :n],
                     x=countries,
                     y=countries,
                     colorbar=dict(title="Quantity (tons)"),
@@ -144,7 +137,7 @@ class ReflexHeatmap:
 
 
 ###############################################################################
-# Singleton (for sharing cached pivot across State instances)
+# Singleton (for sharing cached matrix across State instances)
 reflex_heatmap = ReflexHeatmap()
 
 
@@ -7,6 +7,7 @@ from functools import cached_property
 from pathlib import Path
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from shiny import App, reactive, render, ui
@@ -35,22 +36,47 @@ class ShinyHeatmap:
         return len(self.countries_ordered)
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
+    def full_matrix(self) -> np.ndarray:
+        # Rows are importers and columns exporters, both in rank order,
+        # so the top-N block is the view [:n, :n]
+        return baci.quantity_matrix
 
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
+    @cached_property
+    def full_figure(self) -> go.Figure:
+        """
+        One figure holding the whole matrix. Changing N only moves the axis
+        ranges, so the slider never sends matrix data to the browser again.
+        The colour scale spans the whole matrix, as in the static Plotly page.
+        """
+        countries = self.countries_ordered
+        fig = go.Figure(
+            data=[
+                go.Heatmap(
+                    z=self.full_matrix,
+                    x=countries,
+                    y=countries,
+                    colorbar=dict(title="Quantity (tons)"),
+                    hovertemplate=(
+                        "Exporter: %{x}<br>"
+                        "Importer: %{y}<br>"
+                        "Quantity: %{z:,.3f}<extra></extra>"
+                    ),
+                )
+            ]
+        )
+        fig.update_layout(
+            width=900,
+            height=900,
+            margin=dict(l=120, r=80, t=60, b=120),
+            xaxis=dict(title="Exporter country"),
+            yaxis=dict(title="Importer country"),
+        )
+        return fig
 
-    def _slice_for_n(self, n: int) -> pd.DataFrame:
-        countries = self.countries_ordered[:n]
-        return self.full_matrix.loc[countries, countries]
+    @staticmethod
+    def _axis_range(n: int) -> list[float]:
+        # Categories sit at 0, 1, 2, ... so this shows exactly the first n
+        return [-0.5, n - 0.5]
 
     @cached_property
     def app_ui(self):
@@ -71,10 +97,6 @@ class ShinyHeatmap:
         )
 
     def server(self, input, output, session):
-        @reactive.calc
-        def mat_n() -> pd.DataFrame:
-            return self._slice_for_n(int(input.top_n()))
-
         @output
         @render.text
         def status():
@@ -84,38 +106,31 @@ class ShinyHeatmap:
         @output
         @render_widget
         def heatmap():
-            m = mat_n()
-            countries = list(m.columns)
-
-            fig = go.Figure(
-                data=[
-                    go.Heatmap(
-                        z=m.to_numpy(),
-                        x=countries,
-                        y=countries,
-                        colorbar=dict(title="Quantity (tons)"),
-                        hovertemplate=(
-                            "Exporter: %{x}<br>"
-                            "Importer: %{y}<br>"
-                            "Quantity: %{z:,.3f}<extra></extra>"
-                        ),
-                    )
-                ]
-            )
-            fig.update_layout(
-                width=900,
-                height=900,
-                margin=dict(l=120, r=80, t=60, b=120),
-                xaxis=dict(title="Exporter country"),
-                yaxis=dict(title="Importer country"),
-            )
-
             # shinywidgets is happiest when returning a widget-like object;
             # Plotly provides FigureWidget for this purpose.
-            return go.FigureWidget(fig)
+            # It is rendered once per session, the slider is handled below.
+            widget = go.FigureWidget(self.full_figure)
+            with reactive.isolate():
+                n = int(input.top_n())
+            widget.update_layout(
+                xaxis_range=self._axis_range(n), yaxis_range=self._axis_range(n)
+            )
+            return widget
+
+        @reactive.effect
+        def _zoom_to_top_n():
+            n = int(input.top_n())
+            widget = heatmap.widget
+            if widget is None:
+                return
+            with widget.batch_update():
+                widget.layout.xaxis.range = self._axis_range(n)
+                widget.layout.yaxis.range = self._axis_range(n)
 
     @cached_property
     def app(self) -> App:
+        # Build the shared figure now so the first session doesn't pay for it
+        self.full_figure
         return App(self.app_ui, self.server)
 
     def __call__(self) -> None:
@@ -10,6 +10,7 @@ from functools import cached_property
 from pathlib import Path
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import solara
@@ -47,30 +48,20 @@ class SolaraHeatmap:
         return len(self.countries_ordered)
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
+    def full_matrix(self) -> np.ndarray:
         """
-        Build the full NxN quantity matrix once, then slice for Top-N.
-        This keeps slider updates fast and deterministic.
+        The full NxN quantity matrix in rank order, built once and shared.
+        The Top-N block is the view [:n, :n], so slider updates are instant.
         """
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
+        return baci.quantity_matrix
 
     def figure_for_n(self, n: int) -> go.Figure:
         countries = self.countries_ordered[:n]
-        m = self.full_matrix.loc[countries, countries]
 
         fig = go.Figure(
             data=[
                 go.Heatmap(
-                    z=m.to_numpy(),
+                    z=self.full_matrix[:n, :n],
                     x=countries,
                     y=countries,
                     colorbar=dict(title="Quantity (tons)"),
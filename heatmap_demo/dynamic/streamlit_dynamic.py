@@ -5,6 +5,7 @@
 from functools import cached_property
 
 # Third-party modules
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
@@ -13,6 +14,19 @@ import streamlit as st
 from heatmap_demo.data.baci_dataset import baci
 
 
+###############################################################################
+@st.cache_resource(show_spinner=False)
+def full_matrix() -> np.ndarray:
+    """
+    Build the FULL NxN matrix ONCE. Shared across reruns and sessions.
+    Rows are importers and columns are exporters, both in rank order, so
+    the rank of a country is directly its position in the matrix.
+    This is a module-level resource so that streamlit doesn't have to hash
+    anything to find it, and so the read-only array is never copied.
+    """
+    return baci.quantity_matrix
+
+
 ###############################################################################
 class StreamlitHeatmap:
 
@@ -32,39 +46,11 @@ class StreamlitHeatmap:
     def max_n(self) -> int:
         return len(self.countries_ordered)
 
-    @st.cache_data(show_spinner=False)
-    def full_matrix(self) -> pd.DataFrame:
-        """Build the FULL NxN pivot matrix ONCE. Cached across reruns."""
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
-
-    def slice_for_n(self, n: int) -> tuple[list[str], list[str], list[list[float]]]:
+    def slice_for_n(self, n: int) -> tuple[list[str], list[str], np.ndarray]:
         countries = self.countries_ordered[:n]
-        mat_n = self.full_matrix().loc[countries, countries]
-        return countries, countries, mat_n.to_numpy().tolist()
-
-    def render(self) -> None:
-        """Render the Streamlit UI (called on every rerun)."""
-        st.set_page_config(page_title=self.title, layout="wide")
-        st.title(self.title)
-
-        n = st.slider(
-            "Top N countries",
-            min_value=2,
-            max_value=self.max_n,
-            value=min(10, self.max_n),
-            step=1,
-        )
+        return countries, countries, full_matrix()[:n, :n]
 
+    def build_figure(self, n: int) -> go.Figure:
         x, y, z = self.slice_for_n(n)
 
         fig = go.Figure(
@@ -89,6 +75,22 @@ class StreamlitHeatmap:
                 yaxis=dict(title="Importer country"),
             ),
         )
+        return fig
+
+    def render(self) -> None:
+        """Render the Streamlit UI (called on every rerun)."""
+        st.set_page_config(page_title=self.title, layout="wide")
+        st.title(self.title)
+
+        n = st.slider(
+            "Top N countries",
+            min_value=2,
+            max_value=self.max_n,
+            value=min(10, self.max_n),
+            step=1,
+        )
+
+        fig = figure_for_n(n)
 
         st.plotly_chart(fig, use_container_width=False)
 
@@ -102,6 +104,18 @@ class StreamlitHeatmap:
 # Make a singleton
 streamlit_heatmap = StreamlitHeatmap()
 
+
+###############################################################################
+@st.cache_resource(show_spinner=False)
+def figure_for_n(n: int) -> go.Figure:
+    """
+    The slider only has `max_n` positions and Streamlit reruns the whole
+    script on every move, so each figure is built once and shared across
+    reruns and sessions.
+    """
+    return streamlit_heatmap.build_figure(n)
+
+
 # Run the singleton when run as a script
 if __name__ == "__main__":
     streamlit_heatmap()
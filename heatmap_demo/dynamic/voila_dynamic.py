@@ -9,6 +9,7 @@ from functools import cached_property
 
 # Third-party modules
 import ipywidgets as widgets
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from IPython.display import display
@@ -41,25 +42,16 @@ class VoilaHeatmap:
         return int(len(self.countries_ordered))
 
     @cached_property
-    def full_matrix(self) -> pd.DataFrame:
-        countries = self.countries_ordered
-        sub = self.df[["exporter_name", "importer_name", "quantity"]]
-
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=countries, columns=countries, fill_value=0.0)
-        return mat
-
-    def _slice_for_n(self, n: int) -> tuple[list[str], list[str], list[list[float]]]:
+    def full_matrix(self) -> np.ndarray:
+        # Rows are importers and columns exporters, both in rank order,
+        # so the top-N block is the view [:n, :n]
+        return baci.quantity_matrix
+
+    def _slice_for_n(self, n: int) -> tuple[list[str], list[str], np.ndarray]:
         countries = self.countries_ordered[:n]
-        mat_n = self.full_matrix.loc[countries, countries]  # rows then cols
         x = countries
         y = countries
-        z = mat_n.to_numpy().tolist()
+        z = self.full_matrix[:n, :n]  # rows then cols
         return x, y, z
 
     @cached_property
@@ -77,9 +69,16 @@ class VoilaHeatmap:
     def status(self) -> widgets.HTML:
         return widgets.HTML()
 
+    @staticmethod
+    def _axis_range(n: int) -> list[float]:
+        # Categories sit at 0, 1, 2, ... so this shows exactly the first n
+        return [-0.5, n - 0.5]
+
     @cached_property
     def fig(self) -> go.FigureWidget:
-        x, y, z = self._slice_for_n(int(self.slider.value))
+        # The widget holds the whole matrix, changing N only moves the axis
+        # ranges so no data is sent to the browser again
+        x, y, z = self._slice_for_n(self.max_n)
         fig = go.FigureWidget(
             data=[
                 go.Heatmap(
@@ -111,11 +110,9 @@ class VoilaHeatmap:
         controls = widgets.HBox([self.slider, self.status])
 
         def update(n: int) -> None:
-            x, y, z = self._slice_for_n(n)
             with self.fig.batch_update():
-                self.fig.data[0].x = x
-                self.fig.data[0].y = y
-                self.fig.data[0].z = z
+                self.fig.layout.xaxis.range = self._axis_range(n)
+                self.fig.layout.yaxis.range = self._axis_range(n)
             self.status.value = f"<b>Showing:</b> {n} × {n} countries"
 
         def on_change(change):
@@ -173,8 +170,17 @@ class VoilaHeatmap:
         env = os.environ.copy()
         env["PYTHONPATH"] = str(get_output_dir().parent)
 
+        # Voilà runs every page in a fresh kernel. Preheating keeps one kernel
+        # that has already executed the notebook (loaded the data and built
+        # the widgets) waiting for the next visitor.
         subprocess.run(
-            ["voila", str(nb_path), "--strip_sources=True", "--theme=auto"],
+            [
+                "voila",
+                str(nb_path),
+                "--strip_sources=True",
+                "--theme=auto",
+                "--preheat_kernel=True",
+            ],
             check=False,
             env=env,
         )
@@ -7,6 +7,7 @@ from functools import cached_property
 from pathlib import Path
 
 # Third-party modules
+import numpy as np
 from bokeh.io import output_file, save
 from bokeh.layouts import column, row
 from bokeh.models import (
@@ -24,7 +25,7 @@ from bokeh.palettes import brewer, interp_palette
 from bokeh.plotting import figure
 
 # Internal modules
-from ..common import split_thousands
+from ..common import split_thousands_array
 from heatmap_demo import project_url
 from heatmap_demo.data.baci_dataset import baci
 from heatmap_demo.paths import get_output_dir
@@ -45,7 +46,8 @@ class BokehHeatmapResize:
 
     @cached_property
     def layout(self):
-        df = baci.ranked_oak_df.copy()
+        df = baci.ranked_oak_df
+        quantity = df["quantity"].to_numpy()
 
         # Log color mappers require strictly positive values.
         # We keep the original `quantity` for data integrity and create a
@@ -55,13 +57,27 @@ class BokehHeatmapResize:
         # uses the same color as 1). We do that by clamping the color-mapper
         # low bound to 1.0 whenever the dataset has any values >= 1.
 
-        positive = df.loc[df["quantity"] > 0, "quantity"]
+        positive = quantity[quantity > 0]
         min_positive = float(positive.min()) if len(positive) else 1.0
         max_positive = float(positive.max()) if len(positive) else 1.0
         low = 1.0 if max_positive >= 1.0 else min_positive
-        df["quantity_color"] = df["quantity"].clip(lower=low)
-        df["quantity_display"] = df["quantity"].map(split_thousands)
-        df["value_display"] = (df["value"] * 1000).map(split_thousands)
+
+        # Only the columns the browser needs, as plain arrays. This spares a
+        # copy of the whole dataframe and keeps the embedded JSON small.
+        data = {
+            "exporter_name": df["exporter_name"].to_numpy(dtype=object),
+            "importer_name": df["importer_name"].to_numpy(dtype=object),
+            # Numeric columns are sent as small typed arrays, a 200 country
+            # rank fits in 16 bits and colours don't need double precision
+            # Countries without a rank get one past the last, no top-N keeps
+            # them. Dropping the rows instead would shift the exporter offsets
+            "importer_rank": df["importer_rank"].to_numpy(
+                dtype=np.int16, na_value=len(baci.country_ranks) + 1
+            ),
+            "quantity_color": np.clip(quantity, low, None).astype(np.float32),
+            "quantity_display": split_thousands_array(quantity),
+            "value_display": split_thousands_array(df["value"].to_numpy() * 1000),
+        }
 
         # Max N from ranks
         max_n = len(baci.country_ranks)
@@ -77,26 +93,26 @@ class BokehHeatmapResize:
                 "</label>"
             )
 
-        # Build ordered lists of countries by rank (very important)
-        exporters_ordered = (
-            df[["exporter_name", "exporter_rank"]]
-            .drop_duplicates()
-            .sort_values("exporter_rank")["exporter_name"]
-            .tolist()
-        )
-        importers_ordered = (
-            df[["importer_name", "importer_rank"]]
-            .drop_duplicates()
-            .sort_values("importer_rank")["importer_name"]
-            .tolist()
-        )
+        # Ordered lists of countries by rank (very important)
+        # The rank is per country, not per side of the trade, so both axes use
+        # the same list that is already sorted by rank.
+        exporters_ordered = importers_ordered = baci.country_ranks.index.tolist()
+        # Bokeh draws the first categorical factor at the bottom of the y-axis.
+        # Reversed once here, the top-N importers are then always a suffix.
+        importers_reversed = importers_ordered[::-1]
 
         # Full dataset (all pairs/rows you have)
-        source_all = ColumnDataSource(df)
+        source_all = ColumnDataSource(data)
+
+        # The rows are sorted by exporter rank, so the rows of the top-N
+        # exporters are always a prefix of the data. `offsets[n]` is where
+        # that prefix ends, which spares the slider from scanning every row.
+        offsets = baci.exporter_rank_ends
 
         # Initial view: only rows within top-N ranks
-        mask = (df["exporter_rank"] <= initial_n) & (df["importer_rank"] <= initial_n)
-        source_view = ColumnDataSource(df[mask])
+        end = offsets[initial_n]
+        keep = data["importer_rank"][:end] <= initial_n
+        source_view = ColumnDataSource({k: v[:end][keep] for k, v in data.items()})
 
         # Palette: green → cyan → deep blue (close to Altair/Vega-Lite default feel
         # for heatmaps) while keeping a logarithmic color scale.
@@ -106,16 +122,15 @@ class BokehHeatmapResize:
         color_mapper = LogColorMapper(
             palette=gnbu_256,
             low=low,
-            high=float(df["quantity"].max()),
+            high=float(np.nanmax(quantity)),
         )
 
         # Figure with initial factors = top N
         p = figure(
             title="",
             x_range=exporters_ordered[:initial_n],
-            # Bokeh draws the first categorical factor at the bottom of the y-axis.
-            # Reverse so "top-ranked" importers appear at the top visually.
-            y_range=list(reversed(importers_ordered[:initial_n])),
+            # Reversed so "top-ranked" importers appear at the top visually.
+            y_range=importers_reversed[-initial_n:],
             x_axis_location="above",
             tools="pan,wheel_zoom,box_zoom,reset,save",
             toolbar_location="right",
@@ -205,7 +220,8 @@ class BokehHeatmapResize:
                     x_range=p.x_range,
                     y_range=p.y_range,
                     exporters=exporters_ordered,
-                    importers=importers_ordered,
+                    importers_reversed=importers_reversed,
+                    offsets=offsets.tolist(),
                     n_label=n_label,
                 ),
                 code=self.SLIDER_JS_CODE,
@@ -232,28 +248,34 @@ class BokehHeatmapResize:
     // 1) Update the categorical axes to top-N lists
     // (this "resizes" the heatmap)
     const x_factors = exporters.slice(0, N);
-    // Bokeh draws first y factor at the bottom; reverse for top-on-top ordering.
-    const y_factors = importers.slice(0, N).slice().reverse();
+    // Bokeh draws first y factor at the bottom, the list is already reversed
+    // for top-on-top ordering so the top-N importers are its last N entries.
+    const y_factors = importers_reversed.slice(importers_reversed.length - N);
     x_range.factors = x_factors;
     y_range.factors = y_factors;
 
-    // 2) Filter data to those factors so only NxN cells draw
+    // 2) Filter data to the top-N ranks so only NxN cells draw.
+    // Rows are sorted by exporter rank: the top-N exporters are the rows
+    // before offsets[N] and only the importer rank is left to check.
     const data = source_all.data;
     const cols = Object.keys(data);
-
-    const xset = new Set(x_factors);
-    const yset = new Set(y_factors);
+    const end = offsets[Math.min(N, offsets.length - 1)];
+    const im_rank = data['importer_rank'];
+
+    // Collect the kept row indices once, then copy each column into an
+    // array allocated at its final size (typed arrays stay typed).
+    const keep = new Uint32Array(end);
+    let m = 0;
+    for (let i = 0; i < end; i++) {
+        if (im_rank[i] <= N) keep[m++] = i;
+    }
 
     const new_data = {};
-    cols.forEach(c => new_data[c] = []);
-
-    // assumes exporter_name/importer_name columns exist in source_all
-    for (let i = 0; i < data[cols[0]].length; i++) {
-        const ex = data['exporter_name'][i];
-        const im = data['importer_name'][i];
-        if (xset.has(ex) && yset.has(im)) {
-            cols.forEach(c => new_data[c].push(data[c][i]));
-        }
+    for (const c of cols) {
+        const src = data[c];
+        const dst = ArrayBuffer.isView(src) ? new src.constructor(m) : new Array(m);
+        for (let k = 0; k < m; k++) dst[k] = src[keep[k]];
+        new_data[c] = dst;
     }
 
     source_view.data = new_data;
@@ -32,9 +32,7 @@ class D3BlocksHeatmap:
         return int(max(self.df["exporter_rank"].max(), self.df["importer_rank"].max()))
 
     def _pivot_for_n(self, top_n: int) -> pd.DataFrame:
-        df = self.df[
-            (self.df["exporter_rank"] <= top_n) & (self.df["importer_rank"] <= top_n)
-        ]
+        df = baci.topn_view(top_n)
 
         mat = df.pivot_table(
             index="importer_name",
@@ -42,6 +40,7 @@ class D3BlocksHeatmap:
             values="quantity",
             aggfunc="sum",
             fill_value=0.0,
+            observed=True,
         )
         return mat
 
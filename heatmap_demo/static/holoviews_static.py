@@ -8,6 +8,8 @@ from pathlib import Path
 
 # Third-party modules
 import holoviews as hv
+import numpy as np
+import pandas as pd
 import panel as pn
 from panel.io import save as pn_save
 
@@ -29,24 +31,14 @@ class HoloViewsHeatmapStatic:
     title = "Exporter → Importer heatmap (resize by Top-N countries)"
 
     def __init__(self):
-        df = baci.ranked_oak_df.copy()
+        df = baci.ranked_oak_df
         self.df = df
 
         self.max_n = int(max(df["exporter_rank"].max(), df["importer_rank"].max()))
         self.initial_n = min(10, self.max_n)
 
-        self.exporters = (
-            df[["exporter_name", "exporter_rank"]]
-            .drop_duplicates()
-            .sort_values("exporter_rank")["exporter_name"]
-            .tolist()
-        )
-        self.importers = (
-            df[["importer_name", "importer_rank"]]
-            .drop_duplicates()
-            .sort_values("importer_rank")["importer_name"]
-            .tolist()
-        )
+        # Ranks are per country, so both axes share the rank-ordered list
+        self.exporters = self.importers = baci.country_ranks.index.tolist()
 
         # IMPORTANT: keep a reference to the *exact* slider instance used in the app
         self.slider = pn.widgets.IntSlider(
@@ -61,19 +53,16 @@ class HoloViewsHeatmapStatic:
         x = self.exporters[:n]
         y = self.importers[:n]
 
-        sub = self.df[
-            self.df["exporter_name"].isin(x) & self.df["importer_name"].isin(y)
-        ][["exporter_name", "importer_name", "quantity"]]
-
-        mat = sub.pivot_table(
-            index="importer_name",
-            columns="exporter_name",
-            values="quantity",
-            aggfunc="sum",
-            fill_value=0.0,
-        ).reindex(index=y, columns=x, fill_value=0.0)
-
-        long = mat.stack().rename("quantity").reset_index()
+        # The top-N block of the rank-ordered matrix, one row per cell and
+        # importer-major like a stacked pivot, zeros included
+        mat = baci.quantity_matrix[:n, :n]
+        long = pd.DataFrame(
+            {
+                "importer_name": np.repeat(y, n),
+                "exporter_name": np.tile(x, n),
+                "quantity": mat.ravel(),
+            }
+        )
 
         return hv.HeatMap(
             long,
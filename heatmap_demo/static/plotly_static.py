@@ -20,58 +20,41 @@ from heatmap_demo.paths import get_output_dir
 class PlotlyHeatmapOffline:
     """
     Standalone Plotly HTML heatmap with a Top-N slider (no server).
-    This is "offline" in the sense of no server, but it precomputes every N.
-    If max_n is large, the HTML can get big.
-    To reduce size, change the loop to only generate a subset
-    (e.g., steps of 1 up to 30, then steps of 5/10), or cap max_n.
-    The resulting HTML file size is: 12.2 MB
+    This is "offline" in the sense of no server. The page holds the full
+    matrix once and each slider step only zooms the axes on the top-N block,
+    so the HTML grows with the square of max_n instead of its cube.
     """
 
     title = "Exporter → Importer heatmap (resize by Top-N countries)"
 
     def _ordered_lists(self, df: pd.DataFrame):
-        exporters = (
-            df[["exporter_name", "exporter_rank"]]
-            .drop_duplicates()
-            .sort_values("exporter_rank")["exporter_name"]
-            .tolist()
-        )
-        importers = (
-            df[["importer_name", "importer_rank"]]
-            .drop_duplicates()
-            .sort_values("importer_rank")["importer_name"]
-            .tolist()
-        )
+        # `country_ranks` is already in rank order, keep the countries that
+        # actually appear on each side rather than sorting the rows again
+        ranks = baci.country_ranks
+        exporters = ranks.index[ranks.isin(df["exporter_rank"].unique())].tolist()
+        importers = ranks.index[ranks.isin(df["importer_rank"].unique())].tolist()
         return exporters, importers
 
-    def _matrix_for_n(
-        self, df: pd.DataFrame, exporters: list[str], importers: list[str], n: int
-    ):
+    def _matrix_for_n(self, exporters: list[str], importers: list[str], n: int):
         x = exporters[:n]
         y = importers[:n]
 
-        # Filter to top-N x top-N
-        sub = df[(df["exporter_name"].isin(x)) & (df["importer_name"].isin(y))][
-            ["exporter_name", "importer_name", "quantity"]
-        ]
-
-        # Pivot to full NxN matrix and fill missing with 0
-        mat = (
-            sub.pivot_table(
-                index="importer_name",
-                columns="exporter_name",
-                values="quantity",
-                aggfunc="sum",
-                fill_value=0.0,
-            )
-            .reindex(index=y, columns=x, fill_value=0.0)
-            .to_numpy()
-        )
+        # The shared matrix has every ranked country on both axes, pick the
+        # rows and columns of the countries listed here by their rank
+        ranks = baci.country_ranks
+        rows = ranks[y].to_numpy() - 1
+        cols = ranks[x].to_numpy() - 1
+        mat = baci.quantity_matrix[np.ix_(rows, cols)]
         return x, y, mat
 
+    @staticmethod
+    def _axis_range(n: int, countries: list[str]) -> list[float]:
+        # Categories sit at 0, 1, 2, ... and some countries only trade one way
+        return [-0.5, min(n, len(countries)) - 0.5]
+
     @cached_property
     def fig(self) -> go.Figure:
-        df = baci.ranked_oak_df.copy()
+        df = baci.ranked_oak_df
 
         max_n = int(max(df["exporter_rank"].max(), df["importer_rank"].max()))
         min_n = 2
@@ -79,20 +62,17 @@ class PlotlyHeatmapOffline:
 
         exporters, importers = self._ordered_lists(df)
 
-        # Precompute matrices for each N (offline slider swaps frames)
-        frames = []
+        # The whole matrix is sent once, zooming on it replaces the frames
         global_min = float(df["quantity"].min())
         global_max = float(df["quantity"].max())
-
-        # Initial trace data
-        x0, y0, z0 = self._matrix_for_n(df, exporters, importers, initial_n)
+        x, y, z = self._matrix_for_n(exporters, importers, max_n)
 
         fig = go.Figure(
             data=[
                 go.Heatmap(
-                    z=z0,
-                    x=x0,
-                    y=y0,
+                    z=z,
+                    x=x,
+                    y=y,
                     colorbar=dict(title="Quantity (tons)"),
                     zmin=global_min,
                     zmax=global_max,
@@ -107,49 +87,30 @@ class PlotlyHeatmapOffline:
                 title=self.title,
                 width=900,
                 height=900,
-                xaxis=dict(title="Exporter country"),
-                yaxis=dict(title="Importer country"),
+                xaxis=dict(
+                    title="Exporter country",
+                    range=self._axis_range(initial_n, exporters),
+                ),
+                yaxis=dict(
+                    title="Importer country",
+                    range=self._axis_range(initial_n, importers),
+                ),
                 margin=dict(l=120, r=80, t=80, b=120),
             ),
         )
 
-        for n in range(min_n, max_n + 1):
-            x, y, z = self._matrix_for_n(df, exporters, importers, n)
-            frames.append(
-                go.Frame(
-                    name=str(n),
-                    data=[
-                        go.Heatmap(
-                            z=z,
-                            x=x,
-                            y=y,
-                            zmin=global_min,
-                            zmax=global_max,
-                        )
-                    ],
-                    layout=go.Layout(
-                        xaxis=dict(categoryorder="array", categoryarray=x),
-                        yaxis=dict(categoryorder="array", categoryarray=y),
-                    ),
-                )
-            )
-
-        fig.frames = frames
-
-        # Slider steps: jump to frame "n"
+        # Slider steps: show the first n exporters and importers
         steps = []
         for n in range(min_n, max_n + 1):
             steps.append(
                 dict(
-                    method="animate",
+                    method="relayout",
                     label=str(n),
                     args=[
-                        [str(n)],
-                        dict(
-                            mode="immediate",
-                            frame=dict(duration=0, redraw=True),
-                            transition=dict(duration=0),
-                        ),
+                        {
+                            "xaxis.range": self._axis_range(n, exporters),
+                            "yaxis.range": self._axis_range(n, importers),
+                        }
                     ],
                 )
             )
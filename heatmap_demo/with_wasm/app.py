@@ -15,6 +15,7 @@ import json
 from functools import lru_cache
 
 # Third-party modules
+import numpy as np
 import panel as pn
 from bokeh.models import (
     BasicTicker,
@@ -63,15 +64,18 @@ def _countries_and_matrix():
     idx = {c: j for j, c in enumerate(countries)}
     n = len(countries)
 
-    # Build full matrix (rows=importer, cols=exporter)
-    mat = [[0.0] * n for _ in range(n)]
-    for r in records:
-        e = r.get("exporter_name")
-        i = r.get("importer_name")
-        if e not in idx or i not in idx:
-            continue
-        q = float(r.get("quantity") or 0.0)
-        mat[idx[i]][idx[e]] += q
+    # Build full matrix (rows=importer, cols=exporter) with one bincount over
+    # the flat cell index, so pairs that appear several times are summed
+    exp_idx = [idx.get(r.get("exporter_name"), -1) for r in records]
+    imp_idx = [idx.get(r.get("importer_name"), -1) for r in records]
+    exp_idx = np.array(exp_idx, dtype=np.intp)
+    imp_idx = np.array(imp_idx, dtype=np.intp)
+    qty = np.array([float(r.get("quantity") or 0.0) for r in records])
+    known = (exp_idx >= 0) & (imp_idx >= 0)
+    cells = np.bincount(
+        imp_idx[known] * n + exp_idx[known], weights=qty[known], minlength=n * n
+    )
+    mat = cells.reshape(n, n)
 
     return countries, mat
 
@@ -164,26 +168,21 @@ class PanelWasmHeatmap:
         n = int(self.slider.value)
         names = countries[:n]
 
-        xs, ys, exporters, importers, quantities = [], [], [], [], []
-        vmax = 0.0
-        for yi in range(n):
-            for xi in range(n):
-                v = float(mat[yi][xi])
-                vmax = max(vmax, v)
-                exporter = names[xi]
-                importer = names[yi]
-                xs.append(exporter)
-                ys.append(importer)
-                exporters.append(exporter)
-                importers.append(importer)
-                quantities.append(v)
+        # One cell per (importer, exporter) pair, importers vary slowest,
+        # built as whole arrays instead of n² python appends
+        sub = mat[:n, :n]
+        labels = np.asarray(names, dtype=object)
+        exporters = np.tile(labels, n)
+        importers = np.repeat(labels, n)
+        quantities = sub.ravel()
+        vmax = max(0.0, float(sub.max())) if n else 0.0
 
         # Update axis ranges + data
         self.fig.x_range.factors = names
         self.fig.y_range.factors = list(reversed(names))
         self.source.data = dict(
-            x=xs,
-            y=ys,
+            x=exporters,
+            y=importers,
             exporter_name=exporters,
             importer_name=importers,
             quantity=quantities,